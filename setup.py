@@ -26,6 +26,7 @@ setup(
         ('.', ['LICENSE', 'README.rst', 'sphinxcontrib/_version.py'])
     ],
     zip_safe=True,
+    python_requires='>=3.6',
     license='BSD License',
     # http://pypi.python.org/pypi?%3Aaction=list_classifiers
     classifiers=[
@@ -36,10 +37,7 @@ setup(
         'Intended Audience :: System Administrators',
         'Environment :: Console',
         'Operating System :: OS Independent',
-        'Programming Language :: Python :: 2',
-        'Programming Language :: Python :: 2.7',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.5',
         'Programming Language :: Python :: 3.6',
         'Programming Language :: Python :: Implementation :: CPython',
         'Programming Language :: Python :: Implementation :: PyPy',
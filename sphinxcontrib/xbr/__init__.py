@@ -11,10 +11,11 @@
 from .._version import __version__
 
 import re
+import sys
 
-from typing import List, Tuple, Dict, Iterable, Iterator, Union, Any, Set  # noqa: F401
-
-from six import iteritems
+from collections import defaultdict, namedtuple
+from functools import lru_cache
+from typing import List, Tuple, Dict, FrozenSet, Iterable, Iterator, Optional, Union, Any, Set  # noqa: F401
 
 import docutils  # noqa: F401
 
@@ -44,6 +45,15 @@ if False:
 
 logger = logging.getLogger(__name__)
 
+# keys of the XBR state kept in env.ref_context and on pending_xref nodes
+_NS_KEY = sys.intern('xbr:namespace')
+_IFC_KEY = sys.intern('xbr:interface')
+_NSS_KEY = sys.intern('xbr:namespaces')
+_IFCS_KEY = sys.intern('xbr:interfaces')
+
+# namespace entry of the XBR domain data
+NSInfo = namedtuple('NSInfo', 'docname synopsis platform deprecated')
+
 # REs for XBR signatures
 xbr_sig_re = re.compile(r'''^ ([\w.]*\.)?            # interface name(s)
           (\w+)  \s*             # thing name
@@ -51,6 +61,33 @@ xbr_sig_re = re.compile(r'''^ ([\w.]*\.)?            # interface name(s)
            (?:\s* -> \s* (.*))?  #           return annotation
           )? $                   # and nothing more
           ''', re.VERBOSE)
+_xbr_sig_match = xbr_sig_re.match
+
+# RE for splitting type specifiers into cross-reference targets and delimiters
+_XREF_DELIMS_RE = re.compile(r'(\s*[\[\]\(\),](?:\s*or\s)?\s*|\s+or\s+)')
+
+# index entry templates for namespace level objects: objtype -> (without
+# namespace, with namespace)
+_NSLEVEL_INDEX_TEMPLATES = {
+    'function': (_('%s() (built-in function)'), _('%s() (in namespace %s)')),
+    'data': (_('%s (built-in variable)'), _('%s (in namespace %s)')),
+}  # Dict[str, Tuple[str, str]]
+
+# index entry templates for interface members: objtype -> (with namespace,
+# without namespace, namespace only shown if add_module_names is set,
+# fallbacks for names without interface (with/without namespace))
+_MEMBER_INDEX_TEMPLATES = {
+    'method': (_('%s() (%s.%s method)'), _('%s() (%s method)'), True,
+               _('%s() (in namespace %s)'), '%s()'),
+    'staticmethod': (_('%s() (%s.%s static method)'),
+                     _('%s() (%s static method)'), True,
+                     _('%s() (in namespace %s)'), '%s()'),
+    'interfacemethod': (_('%s() (%s.%s interface method)'),
+                        _('%s() (%s interface method)'), False,
+                        _('%s() (in namespace %s)'), '%s()'),
+    'attribute': (_('%s (%s.%s attribute)'), _('%s (%s attribute)'), True,
+                  _('%s (in namespace %s)'), '%s'),
+}  # Dict[str, Tuple[str, str, bool, str, str]]
 
 pairindextypes = {
     'namespace': _('namespace'),
@@ -76,20 +113,32 @@ def _pseudo_parse_arglist(signode, arglist):
     try:
         for argument in arglist.split(','):
             argument = argument.strip()
+            # walk the brackets in from both ends by index, slicing only once
+            left, right = 0, len(argument)
             ends_open = ends_close = 0
-            while argument.startswith('['):
+            while left < right and argument[left] == '[':
                 stack.append(addnodes.desc_optional())
                 stack[-2] += stack[-1]
-                argument = argument[1:].strip()
-            while argument.startswith(']'):
+                left += 1
+                while left < right and argument[left].isspace():
+                    left += 1
+            while left < right and argument[left] == ']':
                 stack.pop()
-                argument = argument[1:].strip()
-            while argument.endswith(']') and not argument.endswith('[]'):
+                left += 1
+                while left < right and argument[left].isspace():
+                    left += 1
+            while left < right and argument[right - 1] == ']' and not (
+                    right - left > 1 and argument[right - 2] == '['):
                 ends_close += 1
-                argument = argument[:-1].strip()
-            while argument.endswith('['):
+                right -= 1
+                while left < right and argument[right - 1].isspace():
+                    right -= 1
+            while left < right and argument[right - 1] == '[':
                 ends_open += 1
-                argument = argument[:-1].strip()
+                right -= 1
+                while left < right and argument[right - 1].isspace():
+                    right -= 1
+            argument = argument[left:right]
             if argument:
                 stack[-1] += addnodes.desc_parameter(argument, argument)
             while ends_open:
@@ -133,10 +182,15 @@ class XBRXrefMixin(object):
                 text = target[1:]
             elif prefix == '~':
                 text = target.split('.')[-1]
-            for node in result.traverse(nodes.Text):
-                _t = nodes.Text(text)
-                node.parent[node.parent.index(node)] = _t
-                break
+            node = result.next_node(nodes.Text)
+            if node is not None:
+                # Text nodes compare equal by content, so look the node up by
+                # identity rather than with parent.index()
+                parent = node.parent
+                for i, child in enumerate(parent.children):
+                    if child is node:
+                        parent[i] = nodes.Text(text)
+                        break
         return result
 
     def make_xrefs(
@@ -149,18 +203,17 @@ class XBRXrefMixin(object):
             env=None,  # type: sphinx.environment.BuildEnvironment
     ):
         # type: (...) -> List[Node]
-        delims = r'(\s*[\[\]\(\),](?:\s*or\s)?\s*|\s+or\s+)'
-        delims_re = re.compile(delims)
-        sub_targets = re.split(delims, target)
+        sub_targets = _XREF_DELIMS_RE.split(target)
 
         split_contnode = bool(contnode and contnode.astext() == target)
 
+        is_delim = _XREF_DELIMS_RE.match
         results = []
         for sub_target in filter(None, sub_targets):
             if split_contnode:
                 contnode = nodes.Text(sub_target)
 
-            if delims_re.match(sub_target):
+            if is_delim(sub_target):
                 results.append(contnode or innernode(sub_target, sub_target))
             else:
                 results.append(
@@ -195,7 +248,7 @@ class XBRObject(ObjectDescription):
         'annotation': directives.unchanged,
     }
 
-    doc_field_types = [
+    doc_field_types = (
         XBRTypedField(
             'parameter',
             label=_('Parameters'),
@@ -236,7 +289,7 @@ class XBRObject(ObjectDescription):
             names=('rtype', ),
             bodyrolename='interface'),
         Field('price', label=_('Price'), has_arg=False, names=('price', )),
-    ]
+    )
 
     allow_nesting = False
 
@@ -254,6 +307,14 @@ class XBRObject(ObjectDescription):
         """
         return False
 
+    def _resolve_nsname(self):
+        # type: () -> str
+        """Return the namespace given as option, else the current one."""
+        nsname = self.options.get('namespace')
+        if nsname is not None:
+            return nsname
+        return self.env.ref_context.get(_NS_KEY)
+
     def handle_signature(self, sig, signode):
         # type: (str, addnodes.desc_signature) -> Tuple[str, str]
         """Transform a XBR signature into RST nodes.
@@ -264,36 +325,37 @@ class XBRObject(ObjectDescription):
         * it is stripped from the displayed name if present
         * it is added to the full name (return value) if not present
         """
-        m = xbr_sig_re.match(sig)
+        m = _xbr_sig_match(sig)
         if m is None:
             raise ValueError
         name_prefix, name, arglist, retann = m.groups()
 
         # determine namespace and interface name (if applicable), as well as full name
-        nsname = self.options.get('namespace',
-                                  self.env.ref_context.get('xbr:namespace'))
-        interfacename = self.env.ref_context.get('xbr:interface')
-        if interfacename:
+        nsname = self._resolve_nsname()
+        interfacename = self.env.ref_context.get(_IFC_KEY)
+        if not name_prefix:
+            # common case: plain name, possibly inside an interface
+            if interfacename:
+                fullname = f'{interfacename}.{name}'
+                add_namespace = False
+            else:
+                interfacename = ''
+                fullname = name
+                add_namespace = True
+        elif interfacename:
             add_namespace = False
-            if name_prefix and name_prefix.startswith(interfacename):
+            if name_prefix.startswith(interfacename):
                 fullname = name_prefix + name
                 # interface name is given again in the signature
                 name_prefix = name_prefix[len(interfacename):].lstrip('.')
-            elif name_prefix:
+            else:
                 # interface name is given in the signature, but different
                 # (shouldn't happen)
-                fullname = interfacename + '.' + name_prefix + name
-            else:
-                # interface name is not given in the signature
-                fullname = interfacename + '.' + name
+                fullname = f'{interfacename}.{name_prefix}{name}'
         else:
             add_namespace = True
-            if name_prefix:
-                interfacename = name_prefix.rstrip('.')
-                fullname = name_prefix + name
-            else:
-                interfacename = ''
-                fullname = name
+            interfacename = name_prefix.rstrip('.')
+            fullname = name_prefix + name
 
         signode['namespace'] = nsname
         signode['interface'] = interfacename
@@ -308,30 +370,22 @@ class XBRObject(ObjectDescription):
         # exceptions are a special case, since they are documented in the
         # 'exceptions' namespace.
         elif add_namespace and self.env.config.add_module_names:
-            nsname = self.options.get(
-                'namespace', self.env.ref_context.get('xbr:namespace'))
             if nsname and nsname != 'exceptions':
-                nodetext = nsname + '.'
+                nodetext = f'{nsname}.'
                 signode += addnodes.desc_addname(nodetext, nodetext)
 
-        anno = self.options.get('annotation')
-
         signode += addnodes.desc_name(name, name)
-        if not arglist:
-            if self.needs_arglist():
-                # for callables, add an empty parameter list
-                signode += addnodes.desc_parameterlist()
-            if retann:
-                signode += addnodes.desc_returns(retann, retann)
-            if anno:
-                signode += addnodes.desc_annotation(' ' + anno, ' ' + anno)
-            return fullname, name_prefix
-
-        _pseudo_parse_arglist(signode, arglist)
+        if arglist:
+            _pseudo_parse_arglist(signode, arglist)
+        elif self.needs_arglist():
+            # for callables, add an empty parameter list
+            signode += addnodes.desc_parameterlist()
         if retann:
             signode += addnodes.desc_returns(retann, retann)
+        anno = self.options.get('annotation')
         if anno:
-            signode += addnodes.desc_annotation(' ' + anno, ' ' + anno)
+            anno_text = ' ' + anno
+            signode += addnodes.desc_annotation(anno_text, anno_text)
         return fullname, name_prefix
 
     def get_index_text(self, nsname, name):
@@ -341,9 +395,8 @@ class XBRObject(ObjectDescription):
 
     def add_target_and_index(self, name_ifc, sig, signode):
         # type: (str, str, addnodes.desc_signature) -> None
-        nsname = self.options.get('namespace',
-                                  self.env.ref_context.get('xbr:namespace'))
-        fullname = (nsname and nsname + '.' or '') + name_ifc[0]
+        nsname = self._resolve_nsname()
+        fullname = f'{nsname}.{name_ifc[0]}' if nsname else name_ifc[0]
         # note target
         if fullname not in self.state.document.ids:
             signode['names'].append(fullname)
@@ -358,13 +411,33 @@ class XBRObject(ObjectDescription):
                     self.env.doc2path(objects[fullname][0]) +
                     ', use :noindex: for one of them',
                     line=self.lineno)
-            objects[fullname] = (self.env.docname, self.objtype)
+            self.env.get_domain('xbr').note_object(fullname, self.env.docname,
+                                                   self.objtype)
 
         indextext = self.get_index_text(nsname, name_ifc)
         if indextext:
             self.indexnode['entries'].append(('single', indextext, fullname,
                                               '', None))
 
+    def _push_interface(self, prefix):
+        # type: (str) -> None
+        """Make *prefix* the current interface, stacking it if nestable."""
+        ref_context = self.env.ref_context
+        ref_context[_IFC_KEY] = prefix
+        if self.allow_nesting:
+            ref_context[_IFCS_KEY].append(prefix)
+
+    def _pop_interface(self):
+        # type: () -> None
+        """Unstack the current interface if nestable, and make the enclosing
+        one current again.
+        """
+        ref_context = self.env.ref_context
+        interfaces = ref_context[_IFCS_KEY]
+        if self.allow_nesting and interfaces:
+            interfaces.pop()
+        ref_context[_IFC_KEY] = interfaces[-1] if interfaces else None
+
     def before_content(self):
         # type: () -> None
         """Handle object nesting before content
@@ -390,15 +463,11 @@ class XBRObject(ObjectDescription):
             elif name_prefix:
                 prefix = name_prefix.strip('.')
         if prefix:
-            self.env.ref_context['xbr:interface'] = prefix
-            if self.allow_nesting:
-                interfaces = self.env.ref_context.setdefault(
-                    'xbr:interfaces', [])
-                interfaces.append(prefix)
+            self._push_interface(prefix)
         if 'namespace' in self.options:
-            namespaces = self.env.ref_context.setdefault('xbr:namespaces', [])
-            namespaces.append(self.env.ref_context.get('xbr:namespace'))
-            self.env.ref_context['xbr:namespace'] = self.options['namespace']
+            self.env.ref_context[_NSS_KEY].append(
+                self.env.ref_context.get(_NS_KEY))
+            self.env.ref_context[_NS_KEY] = self.options['namespace']
 
     def after_content(self):
         # type: () -> None
@@ -411,20 +480,13 @@ class XBRObject(ObjectDescription):
         be altered as we didn't affect the nesting levels in
         :xbr:meth:`before_content`.
         """
-        interfaces = self.env.ref_context.setdefault('xbr:interfaces', [])
-        if self.allow_nesting:
-            try:
-                interfaces.pop()
-            except IndexError:
-                pass
-        self.env.ref_context['xbr:interface'] = (interfaces[-1] if
-                                                 len(interfaces) > 0 else None)
+        self._pop_interface()
         if 'namespace' in self.options:
-            namespaces = self.env.ref_context.setdefault('xbr:namespaces', [])
+            namespaces = self.env.ref_context[_NSS_KEY]
             if namespaces:
-                self.env.ref_context['xbr:namespace'] = namespaces.pop()
+                self.env.ref_context[_NS_KEY] = namespaces.pop()
             else:
-                self.env.ref_context.pop('xbr:namespace')
+                self.env.ref_context.pop(_NS_KEY)
 
 
 class XBRNamespacelevel(XBRObject):
@@ -438,16 +500,12 @@ class XBRNamespacelevel(XBRObject):
 
     def get_index_text(self, nsname, name_ifc):
         # type: (str, str) -> str
-        if self.objtype == 'function':
-            if not nsname:
-                return _('%s() (built-in function)') % name_ifc[0]
-            return _('%s() (in namespace %s)') % (name_ifc[0], nsname)
-        elif self.objtype == 'data':
-            if not nsname:
-                return _('%s (built-in variable)') % name_ifc[0]
-            return _('%s (in namespace %s)') % (name_ifc[0], nsname)
-        else:
+        templates = _NSLEVEL_INDEX_TEMPLATES.get(self.objtype)
+        if templates is None:
             return ''
+        if not nsname:
+            return templates[0] % name_ifc[0]
+        return templates[1] % (name_ifc[0], nsname)
 
 
 class XBRInterfacelike(XBRObject):
@@ -494,60 +552,21 @@ class XBRInterfacemember(XBRObject):
 
     def get_index_text(self, nsname, name_ifc):
         # type: (str, str) -> str
-        name, ifc = name_ifc
-        add_namespaces = self.env.config.add_module_names
-        if self.objtype == 'method':
-            try:
-                ifcname, methname = name.rsplit('.', 1)
-            except ValueError:
-                if nsname:
-                    return _('%s() (in namespace %s)') % (name, nsname)
-                else:
-                    return '%s()' % name
-            if nsname and add_namespaces:
-                return _('%s() (%s.%s method)') % (methname, nsname, ifcname)
-            else:
-                return _('%s() (%s method)') % (methname, ifcname)
-        elif self.objtype == 'staticmethod':
-            try:
-                ifcname, methname = name.rsplit('.', 1)
-            except ValueError:
-                if nsname:
-                    return _('%s() (in namespace %s)') % (name, nsname)
-                else:
-                    return '%s()' % name
-            if nsname and add_namespaces:
-                return _('%s() (%s.%s static method)') % (methname, nsname,
-                                                          ifcname)
-            else:
-                return _('%s() (%s static method)') % (methname, ifcname)
-        elif self.objtype == 'interfacemethod':
-            try:
-                ifcname, methname = name.rsplit('.', 1)
-            except ValueError:
-                if nsname:
-                    return _('%s() (in namespace %s)') % (name, nsname)
-                else:
-                    return '%s()' % name
-            if nsname:
-                return _('%s() (%s.%s interface method)') % (methname, nsname,
-                                                             ifcname)
-            else:
-                return _('%s() (%s interface method)') % (methname, ifcname)
-        elif self.objtype == 'attribute':
-            try:
-                ifcname, attrname = name.rsplit('.', 1)
-            except ValueError:
-                if nsname:
-                    return _('%s (in namespace %s)') % (name, nsname)
-                else:
-                    return name
-            if nsname and add_namespaces:
-                return _('%s (%s.%s attribute)') % (attrname, nsname, ifcname)
-            else:
-                return _('%s (%s attribute)') % (attrname, ifcname)
-        else:
+        templates = _MEMBER_INDEX_TEMPLATES.get(self.objtype)
+        if templates is None:
             return ''
+        tmpl_ns, tmpl, uses_add_names, fallback_ns, fallback = templates
+        name = name_ifc[0]
+        try:
+            ifcname, membername = name.rsplit('.', 1)
+        except ValueError:
+            if nsname:
+                return fallback_ns % (name, nsname)
+            return fallback % name
+        if nsname and (self.env.config.add_module_names or
+                       not uses_add_names):
+            return tmpl_ns % (membername, nsname, ifcname)
+        return tmpl % (membername, ifcname)
 
 
 class XBRDecoratorMixin(object):
@@ -613,16 +632,17 @@ class XBRNamespace(Directive):
         env = self.state.document.settings.env
         nsname = self.arguments[0].strip()
         noindex = 'noindex' in self.options
-        env.ref_context['xbr:namespace'] = nsname
+        env.ref_context[_NS_KEY] = nsname
         ret = []
         if not noindex:
-            env.domaindata['xbr']['namespaces'][nsname] = \
-                (env.docname, self.options.get('synopsis', ''),
-                 self.options.get('platform', ''), 'deprecated' in self.options)
+            domain = env.get_domain('xbr')
+            domain.note_namespace(nsname, env.docname,
+                                  self.options.get('synopsis', ''),
+                                  self.options.get('platform', ''),
+                                  'deprecated' in self.options)
             # make a duplicate entry in 'objects' to facilitate searching for
             # the namespace in XBRDomain.find_obj()
-            env.domaindata['xbr']['objects'][nsname] = (env.docname,
-                                                        'namespace')
+            domain.note_object(nsname, env.docname, 'namespace')
             _tf = nodes.target
             targetnode = _tf('', '', ids=['namespace-' + nsname], ismod=True)
             self.state.document.note_explicit_target(targetnode)
@@ -653,17 +673,17 @@ class XBRCurrentNamespace(Directive):
         env = self.state.document.settings.env
         nsname = self.arguments[0].strip()
         if nsname == 'None':
-            env.ref_context.pop('xbr:namespace', None)
+            env.ref_context.pop(_NS_KEY, None)
         else:
-            env.ref_context['xbr:namespace'] = nsname
+            env.ref_context[_NS_KEY] = nsname
         return []
 
 
 class XBRXRefRole(XRefRole):
     def process_link(self, env, refnode, has_explicit_title, title, target):
         # type: (sphinx.environment.BuildEnvironment, Node, bool, str, str) -> Tuple[str, str]  # NOQA
-        refnode['xbr:namespace'] = env.ref_context.get('xbr:namespace')
-        refnode['xbr:interface'] = env.ref_context.get('xbr:interface')
+        refnode[_NS_KEY] = env.ref_context.get(_NS_KEY)
+        refnode[_IFC_KEY] = env.ref_context.get(_IFC_KEY)
         if not has_explicit_title:
             title = title.lstrip('.')  # only has a meaning for the target
             target = target.lstrip('~')  # only has a meaning for the title
@@ -682,6 +702,13 @@ class XBRXRefRole(XRefRole):
         return title, target
 
 
+@lru_cache(maxsize=None)
+def _sorted_ignores(prefixes):
+    # type: (Tuple[str, ...]) -> Tuple[str, ...]
+    """Return the namespace prefixes to ignore, longest first."""
+    return tuple(sorted(prefixes, key=len, reverse=True))
+
+
 class XBRNamespaceIndex(Index):
     """
     Index subinterface to provide the XBR namespace index.
@@ -693,14 +720,13 @@ class XBRNamespaceIndex(Index):
 
     def generate(self, docnames=None):
         # type: (Iterable[str]) -> Tuple[List[Tuple[str, List[List[Union[str, int]]]]], bool]  # NOQA
-        content = {}  # type: Dict[str, List]
+        content = defaultdict(list)  # type: Dict[str, List]
         # list of prefixes to ignore
-        ignores = None  # type: List[str]
-        ignores = self.domain.env.config['modindex_common_prefix']
-        ignores = sorted(ignores, key=len, reverse=True)
+        ignores = _sorted_ignores(
+            tuple(self.domain.env.config['modindex_common_prefix']))
         # list of all namespaces, sorted by namespace name
         namespaces = sorted(
-            iteritems(self.domain.data['namespaces']),
+            self.domain.data['namespaces'].items(),
             key=lambda x: x[0].lower())
         # sort out collapsable namespaces
         prev_nsname = ''
@@ -709,19 +735,19 @@ class XBRNamespaceIndex(Index):
             if docnames and docname not in docnames:
                 continue
 
-            for ignore in ignores:
-                if nsname.startswith(ignore):
-                    nsname = nsname[len(ignore):]
-                    stripped = ignore
-                    break
-            else:
-                stripped = ''
+            stripped = ''
+            if ignores:
+                for ignore in ignores:
+                    if nsname.startswith(ignore):
+                        nsname = nsname[len(ignore):]
+                        stripped = ignore
+                        break
 
-            # we stripped the whole namespace name?
-            if not nsname:
-                nsname, stripped = stripped, ''
+                # we stripped the whole namespace name?
+                if not nsname:
+                    nsname, stripped = stripped, ''
 
-            entries = content.setdefault(nsname[0].lower(), [])
+            entries = content[nsname[0].lower()]
 
             package = nsname.split('.')[0]
             if package != nsname:
@@ -752,7 +778,7 @@ class XBRNamespaceIndex(Index):
         collapse = len(namespaces) - num_toplevels < num_toplevels
 
         # sort by first letter
-        sorted_content = sorted(iteritems(content))
+        sorted_content = sorted(content.items())
 
         return sorted_content, collapse
 
@@ -804,93 +830,178 @@ class XBRDomain(Domain):
     }
     initial_data = {
         'objects': {},  # fullname -> docname, objtype
-        'namespaces': {},  # nsname -> docname, synopsis, platform, deprecated
-    }  # type: Dict[str, Dict[str, Tuple[Any]]]
+        'namespaces': {},  # nsname -> NSInfo
+        'objects_by_doc': {},  # docname -> set(fullname)
+        'objects_by_leaf': {},  # last name component -> [fullname]
+        'namespaces_by_doc': {},  # docname -> set(nsname)
+    }  # type: Dict[str, Dict[str, Any]]
+    data_version = 3
     indices = [
         XBRNamespaceIndex,
     ]
 
+    def __init__(self, env):
+        # type: (sphinx.environment.BuildEnvironment) -> None
+        super(XBRDomain, self).__init__(env)
+        # (nsname, interfacename, name, type, searchmode) -> find_obj() result
+        self._resolve_cache = {}  # type: Dict[Tuple[str, str, str, str, int], List[Tuple[str, Any]]]  # NOQA
+        # object types matched by each role (and by any role)
+        self._objtypes_for_role = {
+            role: frozenset(self.objtypes_for_role(role) or ())
+            for role in self.roles
+        }  # type: Dict[str, FrozenSet[str]]
+        self._all_objtypes = frozenset(self.object_types)
+        # rows yielded by get_objects(), built on first use
+        self._inventory_cache = None  # type: Optional[List[Tuple[str, str, str, str, str, int]]]  # NOQA
+
+    def note_object(self, fullname, docname, objtype):
+        # type: (str, str, str) -> None
+        """Register an object, keeping the per-document and per-leaf-name
+        indices in sync.
+        """
+        self._resolve_cache.clear()
+        self._inventory_cache = None
+        objects = self.data['objects']
+        if fullname not in objects:
+            self.data['objects_by_leaf'].setdefault(
+                fullname.rpartition('.')[2], []).append(fullname)
+        # object types come from a small fixed vocabulary; interning them
+        # lets the membership tests in find_obj() succeed on identity
+        objects[fullname] = (docname, sys.intern(objtype))
+        self.data['objects_by_doc'].setdefault(docname, set()).add(fullname)
+
+    def note_namespace(self, nsname, docname, synopsis, platform, deprecated):
+        # type: (str, str, str, str, bool) -> None
+        """Register a namespace, keeping the per-document index in sync."""
+        self._inventory_cache = None
+        self.data['namespaces'][nsname] = NSInfo(docname, synopsis, platform,
+                                                 deprecated)
+        self.data['namespaces_by_doc'].setdefault(docname, set()).add(nsname)
+
     def clear_doc(self, docname):
         # type: (str) -> None
-        for fullname, (fn, _l) in list(self.data['objects'].items()):
-            if fn == docname:
-                del self.data['objects'][fullname]
-        for nsname, (fn, _x, _x, _x) in list(self.data['namespaces'].items()):
-            if fn == docname:
-                del self.data['namespaces'][nsname]
+        # an entry may have been taken over by a later document (duplicate
+        # description), so only drop those still owned by this one
+        self._resolve_cache.clear()
+        self._inventory_cache = None
+        objects = self.data['objects']
+        objects_by_leaf = self.data['objects_by_leaf']
+        for fullname in self.data['objects_by_doc'].pop(docname, ()):
+            if fullname in objects and objects[fullname][0] == docname:
+                del objects[fullname]
+                leaf = fullname.rpartition('.')[2]
+                leaf_names = objects_by_leaf[leaf]
+                leaf_names.remove(fullname)
+                if not leaf_names:
+                    del objects_by_leaf[leaf]
+        namespaces = self.data['namespaces']
+        for nsname in self.data['namespaces_by_doc'].pop(docname, ()):
+            if nsname in namespaces and namespaces[nsname].docname == docname:
+                del namespaces[nsname]
 
     def merge_domaindata(self, docnames, otherdata):
         # type: (List[str], Dict) -> None
         # XXX check duplicates?
+        docs = set(docnames)
+        note_object = self.note_object
         for fullname, (fn, objtype) in otherdata['objects'].items():
-            if fn in docnames:
-                self.data['objects'][fullname] = (fn, objtype)
-        for nsname, data in otherdata['namespaces'].items():
-            if data[0] in docnames:
-                self.data['namespaces'][nsname] = data
+            if fn in docs:
+                note_object(fullname, fn, objtype)
+        note_namespace = self.note_namespace
+        for nsname, info in otherdata['namespaces'].items():
+            if info.docname in docs:
+                note_namespace(nsname, *info)
 
     def find_obj(self, env, nsname, interfacename, name, type, searchmode=0):
         # type: (sphinx.environment.BuildEnvironment, str, str, str, str, int) -> List[Tuple[str, Any]]  # NOQA
         """Find a XBR object for "name", perhaps using the given namespace
         and/or interfacename.  Returns a list of (name, object entry) tuples.
+
+        Results are cached until the set of known objects changes.
         """
+        key = (nsname or '', interfacename or '', name, type or '', searchmode)
+        matches = self._resolve_cache.get(key)
+        if matches is None:
+            matches = self._find_obj(nsname, interfacename, name, type,
+                                     searchmode)
+            self._resolve_cache[key] = matches
+        return matches
+
+    def _find_obj(self, nsname, interfacename, name, type, searchmode):
+        # type: (str, str, str, str, int) -> List[Tuple[str, Any]]
         # skip parens
         if name[-2:] == '()':
             name = name[:-2]
 
-        if not name:
+        objects = self.data['objects']
+        if not name or not objects:
             return []
 
-        objects = self.data['objects']
         matches = []  # type: List[Tuple[str, Any]]
 
         newname = None
         if searchmode == 1:
+            objects_get = objects.get
             if type is None:
-                objtypes = list(self.object_types)
+                objtypes = self._all_objtypes
             else:
-                objtypes = self.objtypes_for_role(type)
+                objtypes = self._objtypes_for_role.get(type)
             if objtypes is not None:
+                ns_name = nsname + '.' + name if nsname else None
                 if nsname and interfacename:
-                    fullname = nsname + '.' + interfacename + '.' + name
-                    if fullname in objects and objects[fullname][1] in objtypes:
-                        newname = fullname
+                    full_name = nsname + '.' + interfacename + '.' + name
+                    obj = objects_get(full_name)
+                    if obj is not None and obj[1] in objtypes:
+                        newname = full_name
                 if not newname:
-                    if nsname and nsname + '.' + name in objects and \
-                       objects[nsname + '.' + name][1] in objtypes:
-                        newname = nsname + '.' + name
-                    elif name in objects and objects[name][1] in objtypes:
-                        newname = name
+                    obj = objects_get(ns_name) if ns_name else None
+                    if obj is not None and obj[1] in objtypes:
+                        newname = ns_name
                     else:
-                        # "fuzzy" searching mode
-                        searchname = '.' + name
-                        matches = [
-                            (oname, objects[oname]) for oname in objects
-                            if oname.endswith(searchname)
-                            and objects[oname][1] in objtypes  # noqa: W503
-                        ]
+                        obj = objects_get(name)
+                        if obj is not None and obj[1] in objtypes:
+                            newname = name
+                        else:
+                            # "fuzzy" searching mode: only objects whose
+                            # last name component matches can end with name
+                            searchname = '.' + name
+                            leaf = name.rpartition('.')[2]
+                            matches = []
+                            for oname in self.data['objects_by_leaf'].get(
+                                    leaf, ()):
+                                obj = objects[oname]
+                                if oname.endswith(searchname) and \
+                                        obj[1] in objtypes:
+                                    matches.append((oname, obj))
         else:
             # NOTE: searching for exact match, object type is not considered
             if name in objects:
                 newname = name
-            elif type == 'ns':
-                # only exact matches allowed for namespaces
-                return []
-            elif interfacename and interfacename + '.' + name in objects:
-                newname = interfacename + '.' + name
-            elif nsname and nsname + '.' + name in objects:
-                newname = nsname + '.' + name
-            elif nsname and interfacename and \
-                    nsname + '.' + interfacename + '.' + name in objects:
-                newname = nsname + '.' + interfacename + '.' + name
-            # special case: builtin exceptions have namespace "exceptions" set
-            elif type == 'exc' and '.' not in name and \
-                    'exceptions.' + name in objects:
-                newname = 'exceptions.' + name
-            # special case: object methods
-            elif type in ('func', 'meth') and '.' not in name and \
-                    'object.' + name in objects:
-                newname = 'object.' + name
+            # only exact matches allowed for namespaces
+            elif type != 'ns':
+                # remaining candidates in order of priority, each name
+                # built at most once
+                candidates = []
+                if interfacename:
+                    ifc_name = interfacename + '.' + name
+                    candidates.append(ifc_name)
+                if nsname:
+                    ns_dot = nsname + '.'
+                    candidates.append(ns_dot + name)
+                    if interfacename:
+                        candidates.append(ns_dot + ifc_name)
+                if '.' not in name:
+                    # special case: builtin exceptions have namespace
+                    # "exceptions" set
+                    if type == 'exc':
+                        candidates.append('exceptions.' + name)
+                    # special case: object methods
+                    elif type in ('func', 'meth'):
+                        candidates.append('object.' + name)
+                for candidate in candidates:
+                    if candidate in objects:
+                        newname = candidate
+                        break
         if newname is not None:
             matches.append((newname, objects[newname]))
         return matches
@@ -898,8 +1009,8 @@ class XBRDomain(Domain):
     def resolve_xref(self, env, fromdocname, builder, type, target, node,
                      contnode):
         # type: (sphinx.environment.BuildEnvironment, str, Builder, str, str, Node, Node) -> Node  # NOQA
-        nsname = node.get('xbr:namespace')
-        ifcname = node.get('xbr:interface')
+        nsname = node.get(_NS_KEY)
+        ifcname = node.get(_IFC_KEY)
         searchmode = node.hasattr('refspecific') and 1 or 0
         matches = self.find_obj(env, nsname, ifcname, target, type, searchmode)
         if not matches:
@@ -924,8 +1035,8 @@ class XBRDomain(Domain):
     def resolve_any_xref(self, env, fromdocname, builder, target, node,
                          contnode):
         # type: (sphinx.environment.BuildEnvironment, str, sphinx.builders.Builder, str, Node, Node) -> List[Tuple[str, Node]]  # NOQA
-        nsname = node.get('xbr:namespace')
-        ifcname = node.get('xbr:interface')
+        nsname = node.get(_NS_KEY)
+        ifcname = node.get(_IFC_KEY)
         results = []  # type: List[Tuple[str, Node]]
 
         # always search in "refspecific" mode with the :any: role
@@ -944,35 +1055,47 @@ class XBRDomain(Domain):
     def _make_namespace_refnode(self, builder, fromdocname, name, contnode):
         # type: (sphinx.builders.Builder, str, str, Node) -> Node
         # get additional info for namespaces
-        docname, synopsis, platform, deprecated = self.data['namespaces'][name]
+        info = self.data['namespaces'][name]
         title = name
-        if synopsis:
-            title += ': ' + synopsis
-        if deprecated:
+        if info.synopsis:
+            title += ': ' + info.synopsis
+        if info.deprecated:
             title += _(' (deprecated)')
-        if platform:
-            title += ' (' + platform + ')'
-        return make_refnode(builder, fromdocname, docname, 'namespace-' + name,
-                            contnode, title)
+        if info.platform:
+            title += ' (' + info.platform + ')'
+        return make_refnode(builder, fromdocname, info.docname,
+                            'namespace-' + name, contnode, title)
 
     def get_objects(self):
         # type: () -> Iterator[Tuple[str, str, str, str, str, int]]
-        for nsname, info in iteritems(self.data['namespaces']):
-            yield (nsname, nsname, 'namespace', info[0], 'namespace-' + nsname,
-                   0)
-        for refname, (docname, type) in iteritems(self.data['objects']):
-            if type != 'namespace':  # namespaces are already handled
-                yield (refname, refname, type, docname, refname, 1)
+        if self._inventory_cache is None:
+            inventory = [(nsname, nsname, 'namespace', info.docname,
+                          'namespace-' + nsname, 0)
+                         for nsname, info in self.data['namespaces'].items()]
+            # namespaces are already handled
+            inventory.extend((refname, refname, type, docname, refname, 1)
+                             for refname, (docname, type)
+                             in self.data['objects'].items()
+                             if type != 'namespace')
+            self._inventory_cache = inventory
+        yield from self._inventory_cache
 
     def get_full_qualified_name(self, node):
         # type: (Node) -> str
-        nsname = node.get('xbr:namespace')
-        ifcname = node.get('xbr:interface')
+        nsname = node.get(_NS_KEY)
+        ifcname = node.get(_IFC_KEY)
         target = node.get('reftarget')
         if target is None:
             return None
-        else:
-            return '.'.join(filter(None, [nsname, ifcname, target]))
+        elif not target:
+            return '.'.join(filter(None, [nsname, ifcname]))
+        elif nsname:
+            if ifcname:
+                return f'{nsname}.{ifcname}.{target}'
+            return f'{nsname}.{target}'
+        elif ifcname:
+            return f'{ifcname}.{target}'
+        return target
 
 
 class XBRBuilder(Builder):
@@ -1020,26 +1143,6 @@ class XBRBuilder(Builder):
         print('XBR: write_doc(docname={}, doctree={})'.format(
             docname, type(doctree)))
 
-        def _print(nodes):
-            for node in nodes:
-                print('\nNODE:', dir(node), node.attributes,
-                      node.list_attributes)
-                if 'interface' in str(node):
-                    print(node)
-                # print(node.attributes)
-                # pprint(dir(node))
-            if node.children:
-                print('\nCHILDREN:')
-                _print(node.children)
-
-        _print(doctree)
-
-
-#        for node in doctree:
-#            print(dir(node), node.attributes)
-#            for child in node.children:
-#                print(dir(child), child.attributes)
-
     def finish(self):
         # type: () -> None
         """Finish the building process.
@@ -1049,10 +1152,23 @@ class XBRBuilder(Builder):
         pass
 
 
+def _init_ref_context(app, docname, source):
+    # type: (Sphinx, str, List[str]) -> None
+    """Set up the object nesting stacks when a document is read.
+
+    Sphinx clears ``env.ref_context`` after each document, so this gives
+    :xbr:meth:`XBRObject.before_content` and :xbr:meth:`XBRObject.after_content`
+    fresh stacks without a ``setdefault`` on every nested directive.
+    """
+    app.env.ref_context[_IFCS_KEY] = []
+    app.env.ref_context[_NSS_KEY] = []
+
+
 def setup(app):
     # type: (Sphinx) -> Dict[unicode, Any]
     app.add_domain(XBRDomain)
     app.add_builder(XBRBuilder)
+    app.connect('source-read', _init_ref_context)
 
     return {
         'version': __version__,
@@ -10,7 +10,8 @@
 
 import os
 import re
-from typing import List  # noqa: F401
+from array import array
+from typing import List, Optional, Tuple  # noqa: F401
 
 # .. xbr:namespace:: network.xbr.mobility.navigation
 # .. xbr:interface:: INavigationMonitor
@@ -23,36 +24,25 @@ from typing import List  # noqa: F401
 # traverse in-memory data structure (trie)
 # export data to
 
-TEST = """.. xbr:interface:: INavigationMonitor
+# namespace declaration, followed by the namespace name
+NSP_PREFIX = '.. xbr:namespace:: '
 
-    1.0 baz
+# prefix of all XBR directives
+XBR_DIRECTIVE = '.. xbr:'
 
-    1.1 bla
+# line boundaries as recognized by str.splitlines()
+_LINE_BREAKS = '\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029'
+_LINE_BREAK = re.compile('\r\n|[{}]'.format(_LINE_BREAKS))
 
-        1.1.0 foo
-        1.1.1 bar
+# line breaks other than "\n"
+_OTHER_LINE_BREAK = re.compile('[{}]'.format(_LINE_BREAKS[1:]))
 
-        1.1.2 bar
+# start of a line beginning an XBR directive
+_DIRECTIVE_START = re.compile(
+    r'(?<![^{}])\.\. xbr:'.format(_LINE_BREAKS))
 
-        1.1.3 bar
-
-            1.1.1.1 sadsa
-            1.1.1.2 sdfdsf
-
-            1.1.1.3 yxxcs
-            1.1.1.4 999s
-
-    1.2 blub
-
-        1.2.0 hhh
-            1.2.0.0 dsfsdf
-            1.2.0.1 sdfdsf
-        1.2.1 jjj
-
-"""
-
-PAT_NSP = re.compile(r'^\s*.. xbr:namespace:: (?P<name>\S.*)$')
-PAT_IFC = re.compile(r'^\s*.. xbr:interface:: (?P<name>\S.*)$')
+# start of a non-indented, non-empty line
+_BLOCK_END = re.compile(r'(?<=[{}])\S'.format(_LINE_BREAKS))
 
 # re.. xbr:event:: on_navigation_started(navigation_id, destination_name, coordinates, estimated_arrival, estimated_distance)
 
@@ -68,180 +58,281 @@ PAT_IFC = re.compile(r'^\s*.. xbr:interface:: (?P<name>\S.*)$')
 # (None, [(1, []), (6, []), (8, [])])
 
 
-class XBRIDLNode(object):
-    def __init__(self,
-                 level=0,
-                 parent=None,
-                 start_line=0,
-                 line_no=0,
-                 line=None):
-        if parent and parent.level != level - 1:
-            raise Exception(
-                'invalid parent level {} for node with level {}'.format(
-                    parent.level, level))
-        self.level = level
-        self.parent = parent or self
+class XBRIDLTree(object):
+    """Indentation tree of a directive block.
+
+    The nodes are stored as parallel arrays, indexed by node number: node 0
+    is the root of the block (level 0, its own parent), every other node is
+    a non-blank line of the block, in order. Children are looked up through
+    an offsets/indices table built on first use.
+    """
+
+    def __init__(self, start_line, levels, parents, line_nos, lines):
+        # type: (int, array, array, array, List[Optional[str]]) -> None
         self.start_line = start_line
-        self.line_no = line_no
-        self.line = line
-        self.children = []  # type: List[XBRIDLNode]
+        self.levels = levels
+        self.parents = parents
+        self.line_nos = line_nos
+        self.lines = lines
+        self._child_offsets = None  # type: Optional[array]
+        self._child_indices = None  # type: Optional[array]
+
+    def __len__(self):
+        return len(self.levels)
+
+    def node(self, idx):
+        # type: (int) -> XBRIDLNode
+        return XBRIDLNode(self, idx)
+
+    def nodes(self):
+        # type: () -> List[XBRIDLNode]
+        return [XBRIDLNode(self, idx) for idx in range(len(self.levels))]
+
+    def children(self, idx):
+        # type: (int) -> array
+        """Return the node numbers of the children of node *idx*."""
+        offsets, indices = self._child_offsets, self._child_indices
+        if offsets is None or indices is None:
+            offsets, indices = self._build_children()
+            self._child_offsets, self._child_indices = offsets, indices
+        return indices[offsets[idx]:offsets[idx + 1]]
+
+    def _build_children(self):
+        # type: () -> Tuple[array, array]
+        parents = self.parents
+        n = len(parents)
+        offsets = array('i', [0]) * (n + 1)
+        for idx in range(1, n):
+            offsets[parents[idx] + 1] += 1
+        for idx in range(n):
+            offsets[idx + 1] += offsets[idx]
+        indices = array('i', [0]) * max(n - 1, 0)
+        fill = offsets[:-1]
+        for idx in range(1, n):
+            parent = parents[idx]
+            indices[fill[parent]] = idx
+            fill[parent] += 1
+        return offsets, indices
 
-    def __str__(self):
-        return 'XBRIDLNode[{id}](level={level}, parent={parent}, file_line_no={file_line_no}, line="{line}")'.format(
-            id=id(self),
-            level=self.level,
-            parent=id(self.parent),
-            line_no=self.line_no,
-            file_line_no=self.start_line + self.line_no,
-            line=self.line)
 
+class XBRIDLNode(object):
+    """View on a single node of a :class:`XBRIDLTree`."""
 
-def _parse_tree(lines, root):
+    __slots__ = ('tree', 'idx')
 
-    nodes = [root]
+    def __init__(self, tree, idx):
+        # type: (XBRIDLTree, int) -> None
+        self.tree = tree
+        self.idx = idx
 
-    start_line = root.start_line
-    line_no = 0
+    def __eq__(self, other):
+        return (isinstance(other, XBRIDLNode) and self.tree is other.tree and
+                self.idx == other.idx)
 
-    stack = [root]
+    def __ne__(self, other):
+        return not self == other
 
-    for line in lines:
+    def __hash__(self):
+        return hash((id(self.tree), self.idx))
 
-        line_no += 1
+    @property
+    def level(self):
+        # type: () -> int
+        return self.tree.levels[self.idx]
 
-        ls = len(line) - len(line.lstrip(' '))
+    @property
+    def parent(self):
+        # type: () -> XBRIDLNode
+        return XBRIDLNode(self.tree, self.tree.parents[self.idx])
 
-        is_non_empty = line.strip() != ""
+    @property
+    def start_line(self):
+        # type: () -> int
+        return self.tree.start_line
 
-        if is_non_empty:
-            if ls % 4:
-                raise ValueError(
-                    'Indentation not a multiple of 4 spaces: "{0}" [line {}]'.
-                    format(line, line_no))
-            level = int(ls / 4) + 1
+    @property
+    def line_no(self):
+        # type: () -> int
+        return self.tree.line_nos[self.idx]
 
-            if 'procedure' in line:
-                print(is_non_empty, level, stack[-1].level, ls, line_no,
-                      '||{}||'.format(line))
+    @property
+    def line(self):
+        # type: () -> Optional[str]
+        return self.tree.lines[self.idx]
 
-            if level > stack[-1].level + 1:
-                raise ValueError(
-                    'Indentation too deep: "{}" [level={}, whitespace={}, line_no={}]'.
-                    format(line, level, ls, line_no))
+    @property
+    def children(self):
+        # type: () -> List[XBRIDLNode]
+        tree = self.tree
+        return [XBRIDLNode(tree, idx) for idx in tree.children(self.idx)]
 
-            if level > stack[-1].level:
+    def __str__(self):
+        return 'XBRIDLNode[{id}](level={level}, parent={parent}, file_line_no={file_line_no}, line="{line}")'.format(
+            id=self.idx,
+            level=self.level,
+            parent=self.tree.parents[self.idx],
+            file_line_no=self.start_line + self.line_no,
+            line=self.line)
 
-                # print(line)
 
-                node = XBRIDLNode(level, stack[-1], stack[-1].start_line,
-                                  line_no, line)
-                stack[-1].children.append(node)
+def _indent_levels(lines):
+    """Return the indentation level of each line (0 for blank lines).
 
-                nodes.append(node)
-                # yield node
+    Non-blank lines must be indented by a multiple of 4 spaces; a line
+    indented by ``4 * n`` spaces is on level ``n + 1``.
+    """
+    levels = []  # type: List[int]
+    append = levels.append
+    for line_no, line in enumerate(lines, 1):
+        if not line.strip():
+            append(0)
+            continue
+        ls = len(line) - len(line.lstrip(' '))
+        if ls & 3:
+            raise ValueError(
+                'Indentation not a multiple of 4 spaces: "{0}" [line {1}]'.
+                format(line, line_no))
+        append((ls >> 2) + 1)
+    return levels
+
+
+def _parse_tree_core(line_levels):
+    # type: (List[int]) -> Tuple[array, array, array, int]
+    """Build the tree structure from the indentation levels of a block.
+
+    Returns the levels, parent node numbers and (1-based) line numbers of
+    all nodes, node 0 being the root, and the line number of the first line
+    indented too deep (0 if there is none).
+    """
+    levels = array('h', [0])
+    parents = array('i', [0])
+    line_nos = array('i', [0])
+
+    # node numbers of the current path from the root: stack[k] is on level k
+    stack = [0]
+    depth = 1
+    node = 0
 
-                stack.append(node)
+    line_no = 0
+    for level in line_levels:
+        line_no += 1
 
-            elif level == stack[-1].level:
+        # skip empty lines
+        if not level:
+            continue
 
-                print('ZZZ ', line)
+        if level > depth:
+            return levels, parents, line_nos, line_no
 
-                node = XBRIDLNode(level, stack[-1].parent,
-                                  stack[-1].start_line, line_no, line)
-                stack[-1].children.append(node)
+        # dedent (or sibling): return to the parent on the level above
+        node += 1
+        if level < depth:
+            del stack[level:]
+        stack.append(node)
+        depth = level + 1
 
-                nodes.append(node)
-                # yield node
+        levels.append(level)
+        parents.append(stack[level - 1])
+        line_nos.append(line_no)
+
+    return levels, parents, line_nos, 0
 
-            else:
-                print('>')
-
-                while level + 1 < stack[-1].level:
-                    stack.pop()
-                print('.')
-                node = XBRIDLNode(stack[-1].level, stack[-1].parent,
-                                  start_line, line_no, line)
-                # stack[-1].children.append(node)
-
-                nodes.append(node)
-                # yield node
-
-        else:
-            if False:
-                node = XBRIDLNode(
-                    None,
-                    None,
-                    start_line=start_line,
-                    line_no=line_no,
-                    line=line)
-                nodes.append(node)
-                # yield node
-            else:
-                # skip empty line
-                pass
-    return nodes
+
+def _parse_tree(lines, start_line=0):
+    # type: (List[str], int) -> XBRIDLTree
+    line_levels = _indent_levels(lines)
+    levels, parents, line_nos, bad_line_no = _parse_tree_core(line_levels)
+    if bad_line_no:
+        line = lines[bad_line_no - 1]
+        level = line_levels[bad_line_no - 1]
+        raise ValueError(
+            'Indentation too deep: "{}" [level={}, whitespace={}, line_no={}]'.
+            format(line, level, (level - 1) * 4, bad_line_no))
+    node_lines = [None]  # type: List[Optional[str]]
+    node_lines.extend(lines[line_no - 1] for line_no in line_nos[1:])
+    return XBRIDLTree(start_line, levels, parents, line_nos, node_lines)
 
 
 def _extract_from_block(block, start_line):
+    # type: (str, int) -> XBRIDLTree
     lines = block.splitlines()
     l0 = lines[0]
     if l0.startswith('.. xbr:namespace::'):
-        ns_match = PAT_NSP.match(lines[0])
-        if not ns_match:
+        ns_name = l0[len(NSP_PREFIX):]
+        if not l0.startswith(NSP_PREFIX) or not ns_name[:1].strip():
             raise ValueError('invalid namespace declaration: {}'.format(l0))
-        #     ns_name = ns_match.group('name')
-    root = XBRIDLNode(start_line=start_line)
-    nodes = _parse_tree(lines, root)
-    return nodes
+    return _parse_tree(lines, start_line)
+
+
+def _iter_rst_files(root):
+    """Yield the paths of all ``.rst`` files below *root* (top-down, files of
+    a directory before its subdirectories, symlinked directories skipped).
+    """
+    try:
+        entries = list(os.scandir(root))
+    except OSError:
+        return
+    subdirs = []
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            subdirs.append(entry.path)
+        elif entry.name.endswith('.rst') and entry.is_file():
+            yield entry.path
+    for subdir in subdirs:
+        yield from _iter_rst_files(subdir)
 
 
 def _extract(root, filterpaths=None):
+    if filterpaths is not None:
+        filterpaths = frozenset(filterpaths)
     fileblocks = {}
-    for (dirpath, dirnames, filenames) in os.walk(root):
-        for f in filenames:
-            if f.endswith('.rst'):
-                fn = os.path.join(dirpath, f)
-                blocks = []  # type: List[List[str]]
-                if filterpaths is None or fn in filterpaths:
-                    with open(fn) as fd:
-                        contents = fd.read()
-                        lines = contents.splitlines()
-                        for i in range(len(lines)):
-                            if lines[i].startswith('.. xbr:'):
-                                j = i + 1
-                                found_end = False
-                                while j < len(lines):
-                                    if lines[j] and not lines[j][0].isspace():
-                                        found_end = True
-                                        break
-                                    j += 1
-                                if found_end:
-                                    block = '\n'.join(lines[i:j])
-                                else:
-                                    block = '\n'.join(lines[i:])
-
-                                block_nodes = _extract_from_block(block, i)
-                                if block_nodes:
-                                    blocks.extend(block_nodes)
-
-                if blocks:
-                    fileblocks[fn] = blocks
+    for fn in _iter_rst_files(root):
+        if filterpaths is not None and fn not in filterpaths:
+            continue
+        with open(fn) as fd:
+            contents = fd.read()
+        # most documentation files carry no XBR directives at all
+        if XBR_DIRECTIVE not in contents:
+            continue
+        # line numbers follow str.splitlines(), which also breaks lines on
+        # form feeds and the like; only count those when the file has any
+        newlines_only = _OTHER_LINE_BREAK.search(contents) is None
+        blocks = []  # type: List[XBRIDLTree]
+        line_no = 0
+        pos = 0
+        for m in _DIRECTIVE_START.finditer(contents):
+            start = m.start()
+            if newlines_only:
+                line_no += contents.count('\n', pos, start)
+            else:
+                line_no += len(_LINE_BREAK.findall(contents, pos, start))
+            pos = start
+            # the block ends at the next non-indented, non-empty line
+            m_eol = _LINE_BREAK.search(contents, start)
+            m_end = _BLOCK_END.search(contents, m_eol.end()) if m_eol else None
+            end = m_end.start() if m_end is not None else len(contents)
+
+            blocks.append(_extract_from_block(contents[start:end], line_no))
+
+        if blocks:
+            fileblocks[fn] = blocks
     return fileblocks
 
 
-if True:
+if __name__ == '__main__':
     filterpaths = ['./api/namespace/network/xbr/mobility/navigation.rst']
     filterpaths = None
     filterpaths = ['./api/namespace/org/genivi/vss/body.rst']
     filterpaths = ['./api/namespace/com/example/basic.rst']
     fileblocks = _extract('./api/namespace', filterpaths=filterpaths)
 
-    for fn, block_nodes in fileblocks.items():
+    for fn, trees in fileblocks.items():
         print('\n{}:'.format(fn))
-        for node in block_nodes:
-            # print(node)
-            for child in node.children:
-                print(node)
+        for tree in trees:
+            for node in tree.nodes():
+                # print(node)
+                for child in node.children:
+                    print(node)
             # if True or '.. xbr:' in node.line or node.level == 0:
             #    print(node)
 
@@ -1,6 +1,51 @@
 from __future__ import absolute_import
 
+from sphinxcontrib.xbr.extract import _extract, _parse_tree
+
 
 class TestClass(object):
     def test_one(self):
         assert True
+
+
+class TestParseTree(object):
+    def test_parents(self):
+        lines = ['.. xbr:interface:: IFoo', '', '    a', '        b',
+                 '    c', '', '        d']
+        tree = _parse_tree(lines, 10)
+        assert list(tree.levels) == [0, 1, 2, 3, 2, 3]
+        assert list(tree.parents) == [0, 0, 1, 2, 1, 4]
+        assert [c.line for c in tree.node(1).children] == ['    a', '    c']
+        assert tree.node(5).line_no == 7
+
+
+class TestExtract(object):
+    def _blocks(self, tmp_path, contents):
+        path = tmp_path / 'api.rst'
+        path.write_text(contents)
+        return _extract(str(tmp_path))[str(path)]
+
+    def test_blocks(self, tmp_path):
+        blocks = self._blocks(tmp_path, (
+            'Title\n'
+            '=====\n'
+            '\n'
+            '.. xbr:interface:: IFoo\n'
+            '\n'
+            '    .. xbr:procedure:: bar\n'
+            '\n'
+            'Some text.\n'
+            '\n'
+            '.. xbr:interface:: IBaz'))
+        assert [tree.start_line for tree in blocks] == [3, 9]
+        assert blocks[0].lines[1:] == ['.. xbr:interface:: IFoo',
+                                       '    .. xbr:procedure:: bar']
+        assert blocks[1].lines[1:] == ['.. xbr:interface:: IBaz']
+
+    def test_form_feed(self, tmp_path):
+        blocks = self._blocks(tmp_path, (
+            'Title\x0c\n'
+            '.. xbr:interface:: IFoo\n'
+            '    bar\n'))
+        assert [tree.start_line for tree in blocks] == [2]
+        assert blocks[0].lines[1:] == ['.. xbr:interface:: IFoo', '    bar']